@@ -1,5 +1,6 @@
 import streamlit as st
 import pandas as pd
+import numpy as np
 import io
 import base64
 from PIL import Image
@@ -12,6 +13,7 @@ st.set_page_config(
     page_icon=logo,  # Use the logo image as favicon
 )
 
+@st.cache_data
 def get_base64_logo(image_path):
     with open(image_path, "rb") as img_file:
         return base64.b64encode(img_file.read()).decode()
@@ -29,11 +31,39 @@ def display_logo_centered(image_path, width=200):
         unsafe_allow_html=True,
     )
 
+@st.cache_data
+def load_excel(file_bytes):
+    """Parses an uploaded Excel file, memoized on its bytes across reruns."""
+    return pd.read_excel(io.BytesIO(file_bytes), engine="calamine")
+
+@st.cache_data
+def load_seats(file_bytes):
+    """Parses a seat sheet with Arrow-backed strings and normalizes its key columns once."""
+    df = pd.read_excel(io.BytesIO(file_bytes), engine="calamine", dtype_backend="pyarrow")
+    for col in ("Room Number", "Position", "Color", "Parity"):
+        if col in df.columns:
+            # Only a handful of distinct values, so normalize those instead of every row
+            # and keep the column as small integer codes
+            codes, uniques = pd.factorize(df[col])
+            normalized = pd.Index(uniques.astype(str)).str.strip()
+            if col in ("Color", "Parity"):
+                normalized = normalized.str.lower()
+            merged, categories = pd.factorize(normalized)
+            # Appending -1 keeps missing values (code -1) missing after the remap
+            df[col] = pd.Categorical.from_codes(np.append(merged, -1)[codes], categories=categories)
+    return df
+
+def fill_seats(out_seat, out_room, cursor, seat_numbers, rows, room):
+    """Writes the seats at `rows` into the output columns from `cursor`, returning the new cursor."""
+    num_seats = min(rows.size, out_seat.size - cursor)
+    out_seat[cursor:cursor + num_seats] = seat_numbers[rows[:num_seats]]
+    out_room[cursor:cursor + num_seats] = room
+    return cursor + num_seats
+
 def allocate_seats(student_file_content, seats_la_lc_lh, seats_cc_kr, room_constraints):
     """Allocates seats based on student data and room constraints."""
     try:
-        student_file = io.BytesIO(student_file_content.read())
-        df_students = pd.read_excel(student_file)
+        df_students = load_excel(student_file_content.getvalue())
 
         # Normalize and clean column names
         col_map = {col.strip().lower(): col for col in df_students.columns}
@@ -53,67 +83,94 @@ def allocate_seats(student_file_content, seats_la_lc_lh, seats_cc_kr, room_const
         df_students.rename(columns=standardized_columns, inplace=True)
 
         required_columns = ["Roll No", "Name"]
-        if not all(col in df_students.columns for col in required_columns):
-            st.error(f"⚠️ Error: The file must contain at least these columns: {required_columns}")
+        missing_columns = set(required_columns) - set(df_students.columns)
+        if missing_columns:
+            st.error(f"⚠️ Error: The file must contain at least these columns: {required_columns} (missing: {sorted(missing_columns)})")
             return None
 
-        df_seats_la_lc_lh = pd.read_excel(seats_la_lc_lh)
-        df_seats_cc_kr = pd.read_excel(seats_cc_kr)
-
-        # Normalize case in seat data
-        df_seats_la_lc_lh["Color"] = df_seats_la_lc_lh["Color"].astype(str).str.strip().str.lower()
-        df_seats_cc_kr["Parity"] = df_seats_cc_kr["Parity"].astype(str).str.strip().str.lower()
-
-        allocated_seats = []
-        remaining_students = df_students.copy()
+        df_seats_la_lc_lh = load_seats(seats_la_lc_lh.getvalue())
+        df_seats_cc_kr = load_seats(seats_cc_kr.getvalue())
+
+        # Group seat rows once so each constraint is a dict lookup instead of a full scan
+        cc_idx = df_seats_cc_kr.groupby(["Room Number", "Parity"], sort=False, observed=True).indices
+        room_categories = df_seats_la_lc_lh["Room Number"].cat.categories
+        position_categories = df_seats_la_lc_lh["Position"].cat.categories
+        color_categories = df_seats_la_lc_lh["Color"].cat.categories
+        room_codes = df_seats_la_lc_lh["Room Number"].cat.codes.to_numpy()
+        position_codes = df_seats_la_lc_lh["Position"].cat.codes.to_numpy()
+        color_codes = df_seats_la_lc_lh["Color"].cat.codes.to_numpy()
+
+        # Pack (room, position, color) codes into one mixed-radix integer per seat and split
+        # the rows on it in a single stable sort: packed key -> seat rows in sheet order
+        n_positions, n_colors = len(position_categories), len(color_categories)
+        seat_keys = (room_codes.astype(np.int64) * n_positions + position_codes) * n_colors + color_codes
+        keyed_rows = np.flatnonzero((room_codes >= 0) & (position_codes >= 0) & (color_codes >= 0))
+        keyed_rows = keyed_rows[np.argsort(seat_keys[keyed_rows], kind="stable")]
+        keys, starts = np.unique(seat_keys[keyed_rows], return_index=True)
+        la_idx = dict(zip(keys.tolist(), np.split(keyed_rows, starts[1:])))
+        la_seat_numbers = df_seats_la_lc_lh["Seat Number"].to_numpy()
+        cc_seat_numbers = df_seats_cc_kr["Seat Number"].to_numpy()
+
+        # Fill preallocated output columns instead of concatenating per-block DataFrames
+        roll_arr = df_students["Roll No"].to_numpy()
+        name_arr = df_students["Name"].to_numpy()
+        total = len(df_students)
+        out_seat = np.empty(total, dtype=object)
+        out_room = np.empty(total, dtype=object)
+        cursor = 0
 
         for room, constraints in room_constraints.items():
+            if cursor >= total:
+                break
+
             if room.startswith(("LA", "LC", "LH")):
+                room_code = room_categories.get_indexer([room])[0]
+
                 for position, colors in constraints.items():
-                    for color in colors:
-                        color = color.strip().lower()
-                        valid_seats = df_seats_la_lc_lh[
-                            (df_seats_la_lc_lh["Room Number"] == room)
-                            & (df_seats_la_lc_lh["Position"] == position)
-                            & (df_seats_la_lc_lh["Color"] == color)
-                        ]
-
-                        if valid_seats.empty:
-                            continue
-
-                        num_seats = min(len(valid_seats), len(remaining_students))
-                        assigned_students = remaining_students.iloc[:num_seats].copy()
-                        assigned_students["Seat Number"] = valid_seats.iloc[:num_seats]["Seat Number"].values
-                        assigned_students["Room"] = room
-                        assigned_students["Signature"] = ""
-
-                        allocated_seats.append(assigned_students)
-                        remaining_students = remaining_students.iloc[num_seats:]
+                    if cursor >= total:
+                        break
+
+                    position_code = position_categories.get_indexer([position])[0]
+                    if room_code < 0 or position_code < 0:
+                        continue
+
+                    selected = color_categories.get_indexer(list(dict.fromkeys(c.strip().lower() for c in colors)))
+                    selected = selected[selected >= 0]
+                    base_key = (int(room_code) * n_positions + int(position_code)) * n_colors
+
+                    # Seats are handed out colour by colour in the order they were selected
+                    color_rows = [la_idx[base_key + code] for code in selected.tolist() if base_key + code in la_idx]
+
+                    if not color_rows:
+                        continue
+
+                    rows = np.concatenate(color_rows)
+                    cursor = fill_seats(out_seat, out_room, cursor, la_seat_numbers, rows, room)
 
             elif room.startswith(("CC", "KR")):
                 parity_list = [p.strip().lower() for p in constraints.get("Parity", [])]
-                valid_seats = df_seats_cc_kr[
-                    (df_seats_cc_kr["Room Number"] == room)
-                    & (df_seats_cc_kr["Parity"].isin(parity_list))
-                ]
+                parity_rows = [cc_idx[(room, p)] for p in parity_list if (room, p) in cc_idx]
 
-                if valid_seats.empty:
+                if not parity_rows:
                     st.warning(f"⚠️ No valid seats for {room} with parity {parity_list}. Skipping...")
                     continue
 
-                num_seats = min(len(valid_seats), len(remaining_students))
-                assigned_students = remaining_students.iloc[:num_seats].copy()
-                assigned_students["Seat Number"] = valid_seats.iloc[:num_seats]["Seat Number"].values
-                assigned_students["Room"] = room
-                assigned_students["Signature"] = ""
+                # Merge per-parity groups back into original sheet order
+                rows = np.sort(np.concatenate(parity_rows))
+                cursor = fill_seats(out_seat, out_room, cursor, cc_seat_numbers, rows, room)
 
-                allocated_seats.append(assigned_students)
-                remaining_students = remaining_students.iloc[num_seats:]
+        if cursor == 0:
+            st.error("⚠️ Error: No seats could be allocated with the given room constraints.")
+            return None
 
-        df_final = pd.concat(allocated_seats, ignore_index=True)[
-            ["Roll No", "Name", "Seat Number", "Room", "Signature"]
-        ]
-        df_final["Roll No"] = df_final["Roll No"].astype(str)
+        # Students are seated in file order, so every row before the cursor has a seat
+        df_final = pd.DataFrame({
+            "Roll No": roll_arr[:cursor].astype(str),
+            "Name": name_arr[:cursor],
+            "Seat Number": out_seat[:cursor],
+            "Room": out_room[:cursor],
+            "Signature": "",
+        })
         df_final.index += 1
         return df_final
 
@@ -121,15 +178,6 @@ def allocate_seats(student_file_content, seats_la_lc_lh, seats_cc_kr, room_const
         st.error(f"An error occurred: {e}")
         return None
 
-def get_table_download_link(df):
-    """Generates a download link for a dataframe as Excel."""
-    towrite = io.BytesIO()
-    df.to_excel(towrite, index=False, header=True)
-    towrite = towrite.getvalue()
-    b64 = base64.b64encode(towrite).decode()
-    href = f'<a href="data:application/vnd.openxmlformats-officedocument.spreadsheetml.sheet;base64,{b64}" download="allocated_seats.xlsx">Download Excel file</a>'
-    return href
-
 def main():
     display_logo_centered("logo.png", width=200)
 
@@ -173,7 +221,16 @@ def main():
 
             if df_final is not None:
                 st.dataframe(df_final)
-                st.markdown(get_table_download_link(df_final), unsafe_allow_html=True)
+                towrite = io.BytesIO()
+                # xlsxwriter serializes straight to XML instead of building an openpyxl workbook first
+                with pd.ExcelWriter(towrite, engine="xlsxwriter") as writer:
+                    df_final.to_excel(writer, index=False, header=True)
+                st.download_button(
+                    "Download Excel file",
+                    data=towrite.getvalue(),
+                    file_name="allocated_seats.xlsx",
+                    mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+                )
                 st.success("✅ Seat allocation completed!")
 
 if __name__ == "__main__":